@@ -1,21 +1,15 @@
 import argparse
 import os
+import sys
 import logging
-import configparser
 import time
-from copy import deepcopy
 
 from .comicbook import ComicBook
-from .crawlerbase import CrawlerBase, Citem
+from .crawlerbase import CrawlerBase
 from .utils import (
     parser_chapter_str,
-    ensure_file_dir_exists,
-    merge_books,
-    merge_zip_books
+    ensure_file_dir_exists
 )
-from .session import SessionMgr
-from .worker import WorkerPoolMgr
-from .utils.mail import Mail
 from . import VERSION
 from .config import CrawlerConfig
 
@@ -45,6 +39,11 @@ def parse_args():
     下载漫画 id=505430 1到5集,7集，9到10集:
     python3 onepiece.py -id 505430 -i 1-5,7,9-10
     """
+    argv = sys.argv[1:]
+    # -V/--version 不需要构建完整的 parser
+    if '-V' in argv or '--version' in argv:
+        print(VERSION)
+        sys.exit(0)
 
     parser = argparse.ArgumentParser(prog="onepiece")
 
@@ -89,10 +88,15 @@ def parse_args():
     parser.add_argument('-o', '--output', type=str,
                         help="文件保存路径，默认保存在当前路径下的download文件夹")
 
-    s = ' '.join(['%s(%s)' % (crawler.SITE, crawler.SOURCE_NAME) for crawler in ComicBook.CRAWLER_CLS_MAP.values()])
-    site_help_msg = "数据源网站：支持 %s" % s
+    # 站点说明只有 -h/--help 时才会展示
+    if '-h' in argv or '--help' in argv:
+        s = ' '.join(['%s(%s)' % (site, source_name)
+                      for site, (source_name, site_index) in ComicBook.CRAWLER_SITE_INFO.items()])
+        site_help_msg = "数据源网站：支持 %s" % s
+    else:
+        site_help_msg = "数据源网站"
 
-    parser.add_argument('-s', '--site', type=str, choices=ComicBook.CRAWLER_CLS_MAP.keys(),
+    parser.add_argument('-s', '--site', type=str, choices=ComicBook.CRAWLER_REGISTRY.keys(),
                         help=site_help_msg)
 
     parser.add_argument('--verify', action='store_true',
@@ -131,7 +135,7 @@ def parse_args():
     parser.add_argument('-V', '--version', action='version', version=VERSION)
     parser.add_argument('--debug', action='store_true', help="debug")
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     return args
 
 
@@ -149,57 +153,98 @@ def init_logger(debug=False):
     return logger
 
 
+def download_chapter(comicbook, chapter_number, output_dir, ext_name=None,
+                     is_gen_pdf=None, is_gen_zip=None, is_single_image=None,
+                     quality=None, max_height=None, mail=None, receivers=None,
+                     is_send_mail=None):
+    """下载单个章节，出错只打印日志
+    :return chapter_dir: 下载失败返回 None
+    """
+    try:
+        chapter = comicbook.Chapter(chapter_number, ext_name=ext_name)
+        logger.info("正在下载 【%s】 %s 【%s】", comicbook.name, chapter.chapter_number, chapter.title)
+
+        chapter_dir = chapter.save(output_dir=output_dir)
+        logger.info("下载成功 %s", chapter_dir)
+        if is_single_image:
+            img_path = chapter.save_as_single_image(output_dir=output_dir, quality=quality, max_height=max_height)
+            logger.info("生成长图 %s", img_path)
+        if is_gen_pdf:
+            pdf_path = chapter.save_as_pdf(output_dir=output_dir)
+            logger.info("生成pdf文件 %s", pdf_path)
+
+        if is_send_mail:
+            mail.send(subject=os.path.basename(pdf_path),
+                      content=None,
+                      file_list=[pdf_path, ],
+                      receivers=receivers)
+        if is_gen_zip:
+            zip_file_path = chapter.save_as_zip(output_dir=output_dir)
+            logger.info("生成zip文件 %s", zip_file_path)
+        return chapter_dir
+    except Exception:
+        logger.exception('download comicbook error. site=%s comicid=%s chapter_number=%s',
+                         comicbook.crawler.SITE, comicbook.crawler.comicid, chapter_number)
+
+
 def download_main(comicbook, output_dir, ext_name=None, chapters=None,
                   is_download_all=None, is_gen_pdf=None, is_gen_zip=None,
                   is_single_image=None, quality=None, max_height=None, mail=None,
                   receivers=None, is_send_mail=None, merge=None, merge_zip=None,
-                  crawler_delay=None):
+                  crawler_delay=None, worker=None):
+    # 图片下载已占用 WorkerPoolMgr 的线程池，章节单独用一个线程池，避免互相等待
+    from concurrent.futures import ThreadPoolExecutor
+
     is_gen_pdf = is_gen_pdf or mail
     chapter_str = chapters or '-1'
     chapter_numbers = parser_chapter_str(chapter_str=chapter_str,
                                          last_chapter_number=comicbook.get_last_chapter_number(ext_name),
                                          is_all=is_download_all)
-    chapter_dirs = []
-    for chapter_number in chapter_numbers:
+    if not worker:
+        from .worker import WorkerPoolMgr
+        worker = WorkerPoolMgr.POOL_SIZE
+    with ThreadPoolExecutor(max_workers=worker) as executor:
+        future_list = []
         try:
-            chapter = comicbook.Chapter(chapter_number, ext_name=ext_name)
-            logger.info("正在下载 【{}】 {} 【{}】".format(
-                comicbook.name, chapter.chapter_number, chapter.title))
-
-            chapter_dir = chapter.save(output_dir=output_dir)
-            chapter_dirs.append(chapter_dir)
-            logger.info("下载成功 %s", chapter_dir)
-            if is_single_image:
-                img_path = chapter.save_as_single_image(output_dir=output_dir, quality=quality, max_height=max_height)
-                logger.info("生成长图 %s", img_path)
-            if is_gen_pdf:
-                pdf_path = chapter.save_as_pdf(output_dir=output_dir)
-                logger.info("生成pdf文件 %s", pdf_path)
-
-            if is_send_mail:
-                mail.send(subject=os.path.basename(pdf_path),
-                          content=None,
-                          file_list=[pdf_path, ],
-                          receivers=receivers)
-            if is_gen_zip:
-                zip_file_path = chapter.save_as_zip(output_dir=output_dir)
-                logger.info("生成zip文件 %s", zip_file_path)
-        except Exception:
-            logger.exception('download comicbook error. site=%s comicid=%s chapter_number=%s',
-                             comicbook.crawler.SITE, comicbook.crawler.comicid, chapter_number)
-        if crawler_delay:
-            logger.info("crawler delay. sleep %ss", crawler_delay)
-            time.sleep(crawler_delay)
+            for idx, chapter_number in enumerate(chapter_numbers):
+                if idx and crawler_delay:
+                    logger.info("crawler delay. sleep %ss", crawler_delay)
+                    time.sleep(crawler_delay)
+                future = executor.submit(
+                    download_chapter,
+                    comicbook=comicbook,
+                    chapter_number=chapter_number,
+                    output_dir=output_dir,
+                    ext_name=ext_name,
+                    is_gen_pdf=is_gen_pdf,
+                    is_gen_zip=is_gen_zip,
+                    is_single_image=is_single_image,
+                    quality=quality,
+                    max_height=max_height,
+                    mail=mail,
+                    receivers=receivers,
+                    is_send_mail=is_send_mail)
+                future_list.append(future)
+            # 按章节顺序收集，合并时依赖这个顺序
+            chapter_dirs = [future.result() for future in future_list]
+        except BaseException:
+            # 如 Ctrl-C，取消还没开始的章节，否则退出 with 时会等它们全部下载完
+            for future in future_list:
+                future.cancel()
+            raise
+    chapter_dirs = [chapter_dir for chapter_dir in chapter_dirs if chapter_dir]
 
     start = chapter_numbers[0]
     end = chapter_numbers[-1]
     if merge:
+        from .utils import merge_books
         merge_dir = comicbook.get_merge_dir(output_dir=output_dir, start=start, end=end, ext_name=ext_name)
         ensure_file_dir_exists(dirpath=merge_dir)
         merge_books(chapter_dirs=chapter_dirs, output_dir=merge_dir)
         logger.info("合并成单文件夹 %s", merge_dir)
 
     if merge_zip:
+        from .utils import merge_zip_books
         merge_zip_path = comicbook.get_merge_zip_path(output_dir=output_dir, start=start, end=end, ext_name=ext_name)
         ensure_file_dir_exists(filepath=merge_zip_path)
         merge_zip_books(chapter_dirs=chapter_dirs, target_path=merge_zip_path)
@@ -229,20 +274,25 @@ def download_tag_all(tag, page_str, **kwargs):
 
 
 def download_url_list(config, url_file, **kwargs):
-    comicbook = kwargs.pop('comicbook')
+    kwargs.pop('comicbook')
     with open(url_file) as f:
-        for line in f:
-            line = line.strip()
-            if not line or line.startswith('#'):
-                continue
-            url = line
-            site = ComicBook.get_site_by_url(url=url)
-            comicid = ComicBook.get_comicid_by_url(site=site, url=url)
-            if not site or not comicid:
-                logger.info('Unknown url. url=%s', url)
-                continue
+        urls = [line for line in map(str.strip, f) if line and not line.startswith('#')]
+
+    # {site: [comicid, ...]}，同一站点只需要初始化一次
+    site_comicids = {}
+    for url in urls:
+        site = ComicBook.get_site_by_url(url=url)
+        comicid = ComicBook.get_comicid_by_url(site=site, url=url)
+        if not site or not comicid:
+            logger.info('Unknown url. url=%s', url)
+            continue
+        site_comicids.setdefault(site, []).append(comicid)
+
+    for site, comicids in site_comicids.items():
+        init_crawler(site=site, config=config)
+        # 去重并保持顺序
+        for comicid in dict.fromkeys(comicids):
             comicbook = ComicBook(site=site, comicid=comicid)
-            init_crawler(site=site, config=config)
             comicbook.start_crawler()
             echo_comicbook_desc(comicbook=comicbook, ext_name=kwargs.get('ext_name'))
             download_main(comicbook=comicbook, **kwargs)
@@ -263,17 +313,16 @@ def show_tags(comicbook):
 
 def echo_comicbook_desc(comicbook, ext_name=None):
     name = "{} {}".format(comicbook.name, ext_name) if ext_name else comicbook.name
-    msg = ("{source_name} 【{name}】 更新至: {last_chapter_number:>03} "
-           "【{last_chapter_title}】 数据来源: {source_url}").format(
-        source_name=comicbook.source_name,
-        name=name,
-        last_chapter_number=comicbook.get_last_chapter_number(ext_name),
-        last_chapter_title=comicbook.get_last_chapter_title(ext_name),
-        source_url=comicbook.source_url)
-    logger.info(msg)
+    logger.info("%s 【%s】 更新至: %03d 【%s】 数据来源: %s",
+                comicbook.source_name,
+                name,
+                comicbook.get_last_chapter_number(ext_name),
+                comicbook.get_last_chapter_title(ext_name),
+                comicbook.source_url)
 
 
 def init_crawler(site, config):
+    from .session import SessionMgr
     proxy = config.get_proxy(site=site)
     if proxy:
         logger.info('set proxy. %s', proxy)
@@ -290,28 +339,34 @@ def init_crawler(site, config):
 
 
 def save_cookies(site, config):
+    from .session import SessionMgr
     cookies_path = config.get_cookies_path(site)
     if cookies_path:
         ensure_file_dir_exists(filepath=cookies_path)
         SessionMgr.export_cookies(site=site, path=cookies_path)
-        logger.info("cookies saved. path={}".format(cookies_path))
+        logger.info("cookies saved. path=%s", cookies_path)
 
 
 def migrate(comicbook_dir):
-    for crawler_cls in ComicBook.CRAWLER_CLS_MAP.values():
+    for site in ComicBook.CRAWLER_REGISTRY:
+        crawler_cls = ComicBook.get_crawler_cls(site)
         if crawler_cls.SINGLE_CHAPTER:
             dir1 = os.path.join(comicbook_dir, crawler_cls.SOURCE_NAME)
-            for name1 in os.listdir(dir1):
-                dir2 = os.path.join(dir1, name1)
-                if not os.path.isdir(dir2):
-                    continue
-                for name2 in os.listdir(dir2):
-                    dir3 = os.path.join(dir2, name2)
-                    if not os.path.isdir(dir3):
+            # scandir 返回的 DirEntry 自带文件类型，is_dir() 一般不需要再 stat
+            with os.scandir(dir1) as it1:
+                for entry1 in it1:
+                    if not entry1.is_dir():
                         continue
-                    new_name = name2.split(' ')[0]
-                    target = os.path.join(dir2, new_name)
-                    os.rename(dir3, target)
+                    # 先读完目录再重命名，边遍历边改名时是否会再次读到该条目是未定义的
+                    with os.scandir(entry1.path) as it2:
+                        entries = list(it2)
+                    for entry2 in entries:
+                        if not entry2.is_dir():
+                            continue
+                        new_name = entry2.name.split(' ', 1)[0]
+                        target = os.path.join(entry1.path, new_name)
+                        if target != entry2.path:
+                            os.rename(entry2.path, target)
 
 
 def main():
@@ -331,6 +386,7 @@ def main():
         site = args.site or 'qq'
         comicid = args.comicid
 
+    from .worker import WorkerPoolMgr
     WorkerPoolMgr.set_worker(worker=config.worker)
     CrawlerBase.DRIVER_PATH = config.driver_path
     logger.debug('set DRIVER_PATH. DRIVER_PATH=%s', config.driver_path)
@@ -363,6 +419,7 @@ def main():
         exit(0)
 
     if args.mail:
+        from .utils.mail import Mail
         is_send_mail = True
         mail = Mail.init(config.get_config_file())
     else:
@@ -385,7 +442,8 @@ def main():
         receivers=args.receivers,
         merge=args.merge,
         merge_zip=args.merge_zip,
-        crawler_delay=config.crawler_delay
+        crawler_delay=config.crawler_delay,
+        worker=config.worker
     )
 
     if args.url_file:
@@ -5,6 +5,8 @@ import datetime
 import logging
 import weakref
 from collections import defaultdict
+from collections.abc import Mapping
+from operator import attrgetter
 
 from .utils import safe_filename
 from .utils import (
@@ -15,34 +17,115 @@ from .exceptions import (
     SiteNotSupport,
     ChapterNotFound
 )
-from .crawlerbase import CrawlerBase
-from .image import ImageDownloader
 HERE = os.path.abspath(os.path.dirname(__file__))
 
 logger = logging.getLogger(__name__)
 
 
-def find_all_crawler():
-    for file in os.listdir(os.path.join(HERE, "site")):
-        if re.match(r"^[a-zA-Z].*?\.py$", file):
-            importlib.import_module(".site.{}".format(file.split(".")[0]), __package__)
-    return CrawlerBase.__subclasses__()
+# site -> (module, crawler class name). 只记录字符串，用到时再导入对应模块
+CRAWLER_REGISTRY = {
+    'acg456': ('.site.acg456', 'Acg456Crawler'),
+    'bilibili': ('.site.bilibili', 'BilibiliCrawler'),
+    '177pic': ('.site.c177pic', 'C177picCrawler'),
+    '18comic': ('.site.c18comic', 'C18comicCrawler'),
+    '18hmmcg': ('.site.c18hmmcg', 'C18hmmcgCrawler'),
+    '2animx': ('.site.c2animx', 'C2animxCrawler'),
+    '36mh': ('.site.c36mh', 'C36mhCrawler'),
+    '77mh': ('.site.c77mh', 'C77mhCrawler'),
+    'cocomanhua': ('.site.cocomanhua', 'CocomanhuaCrawler'),
+    'dm5': ('.site.dm5', 'DM5Crawler'),
+    'dmzj': ('.site.dmzj', 'DmzjCrawler'),
+    'gufengmh8': ('.site.gufengmh8', 'Gufengmh8Crawler'),
+    'kuaikan': ('.site.kuaikan', 'KuaiKanCrawler'),
+    'manhuadb': ('.site.manhuadb', 'ManhuadbCrawler'),
+    'manhuagui': ('.site.manhuagui', 'ManhuaguiCrawler'),
+    'manhuatai': ('.site.manhuatai', 'ManhuataiCrawler'),
+    'mh1234': ('.site.mh1234', 'Mh1234Crawler'),
+    'mh160': ('.site.mh160', 'Mh160Crawler'),
+    'nhentai': ('.site.nhentai', 'NhentaiCrawler'),
+    'nvshens': ('.site.nvshens', 'NvshensCrawler'),
+    'picxxxx': ('.site.picxxxx', 'PicxxxxCrawler'),
+    'qq': ('.site.qq', 'QQCrawler'),
+    'tuhao456': ('.site.tuhao456', 'Tuhao456Crawler'),
+    'u17': ('.site.u17', 'U17Crawler'),
+    'wnacg': ('.site.wnacg', 'WnacgCrawler'),
+    'xiuren': ('.site.xiren', 'NvshensCrawler'),
+}
+
+# site -> (SOURCE_NAME, SITE_INDEX)，需与各站点 crawler 的类属性保持一致
+CRAWLER_SITE_INFO = {
+    'acg456': ('ACG肆伍陆', 'http://www.acg456.com/'),
+    'bilibili': ('哔哩哔哩漫画', 'https://manga.bilibili.com/'),
+    '177pic': ('177漫画', 'http://www.177pic.info/'),
+    '18comic': ('禁漫天堂', 'https://18comic.vip/'),
+    '18hmmcg': ('18h漫！', 'http://18h.mm-cg.com/'),
+    '2animx': ('二次元动漫', 'https://www.2animx.com/'),
+    '36mh': ('36漫画网', 'https://www.36mh.net/'),
+    '77mh': ('新新漫画', 'https://www.77mh.cc/'),
+    'cocomanhua': ('COCO漫画', 'https://www.cocomanhua.com/'),
+    'dm5': ('DM5', 'https://www.dm5.com/'),
+    'dmzj': ('动漫之家', 'https://www.dmzj.com/'),
+    'gufengmh8': ('古风漫画网', 'https://www.gufengmh8.com/'),
+    'kuaikan': ('快看漫画', 'https://www.kuaikanmanhua.com/'),
+    'manhuadb': ('漫画DB', 'https://www.manhuadb.com/'),
+    'manhuagui': ('漫画柜', 'https://www.manhuagui.com/'),
+    'manhuatai': ('漫画台', 'https://www.manhuatai.com/'),
+    'mh1234': ('漫画1234', 'https://www.mh1234.com/'),
+    'mh160': ('漫画160', 'https://www.mh160.xyz/'),
+    'nhentai': ('NHentai', 'https://nhentai.net/'),
+    'nvshens': ('宅男女神', 'https://www.nvshens.org/'),
+    'picxxxx': ('Nsfwpicx', 'http://picxxxx.top/'),
+    'qq': ('腾讯漫画', 'https://ac.qq.com/'),
+    'tuhao456': ('土豪漫画网', 'https://www.tuhao456.com/'),
+    'u17': ('有妖气', 'https://www.u17.com/'),
+    'wnacg': ('绅士漫画', 'http://www.wnacg.org/'),
+    'xiuren': ('秀人网', 'http://www.xiuren.org/'),
+}
+
+
+class LazyCrawlerMap(Mapping):
+    """
+    site -> crawler class. 第一次取某个站点时才导入对应的模块
+    """
+
+    def __init__(self, registry):
+        self._registry = registry
+        self._loaded = {}
+
+    def __getitem__(self, site):
+        if site not in self._loaded:
+            module_name, cls_name = self._registry[site]
+            module = importlib.import_module(module_name, __package__)
+            self._loaded[site] = getattr(module, cls_name)
+        return self._loaded[site]
+
+    def __contains__(self, site):
+        return site in self._registry
+
+    def __iter__(self):
+        return iter(self._registry)
+
+    def __len__(self):
+        return len(self._registry)
 
 
 class ComicBook():
-    CRAWLER_CLS_MAP = {crawler.SITE: crawler for crawler in find_all_crawler()}
+    CRAWLER_REGISTRY = CRAWLER_REGISTRY
+    CRAWLER_SITE_INFO = CRAWLER_SITE_INFO
+    CRAWLER_CLS_MAP = LazyCrawlerMap(CRAWLER_REGISTRY)
     CHAPTER_NOT_CACHE_SITE = frozenset(['bilibili'])
 
     def __init__(self, site=None, comicid=None):
         if not site:
             site = self.get_site_by_url(comicid)
-        if site not in self.CRAWLER_CLS_MAP:
+        if site not in self.CRAWLER_REGISTRY:
             raise SiteNotSupport(f"SiteNotSupport site={site}")
-        crawler_cls = self.CRAWLER_CLS_MAP[site]
+        crawler_cls = self.get_crawler_cls(site)
 
         url = comicid or crawler_cls.DEFAULT_COMICID
         comicid = self.get_comicid_by_url(site=site, url=url)
         self.crawler = crawler_cls(comicid)
+        from .image import ImageDownloader
         self.image_downloader = ImageDownloader(site=site)
 
         # {ext_name: {chapter_number: Chapter}}
@@ -52,21 +135,25 @@ class ComicBook():
         self.crawler_time = None
         self.comicbook_item = None
 
+    @classmethod
+    def get_crawler_cls(cls, site):
+        return cls.CRAWLER_CLS_MAP[site]
+
     @classmethod
     def get_site_by_url(cls, url):
         if not url:
             return
         uri = re.sub('https?://', '', url)
-        for crawler_cls in cls.CRAWLER_CLS_MAP.values():
-            crawler_uri = re.sub('https?://', '', crawler_cls.SITE_INDEX)
+        for site, (source_name, site_index) in cls.CRAWLER_SITE_INFO.items():
+            crawler_uri = re.sub('https?://', '', site_index)
             if uri.startswith(crawler_uri):
-                return crawler_cls.SITE
+                return site
 
     @classmethod
     def get_comicid_by_url(cls, site, url):
-        if site not in cls.CRAWLER_CLS_MAP:
+        if site not in cls.CRAWLER_REGISTRY:
             return None
-        crawler_cls = cls.CRAWLER_CLS_MAP[site]
+        crawler_cls = cls.get_crawler_cls(site)
         return crawler_cls.get_comicid_by_url(url)
 
     def start_crawler(self):
@@ -87,8 +174,7 @@ class ComicBook():
                     'last_chapter_title': ''
                 }
             else:
-                last_chapter = max(citems.values(),
-                                   key=lambda x: x.chapter_number)
+                last_chapter = max(citems.values(), key=attrgetter('chapter_number'))
                 self.chapter_desc[ext_name] = {
                     'last_chapter_number': last_chapter.chapter_number,
                     'last_chapter_title': last_chapter.title
@@ -128,7 +214,7 @@ class ComicBook():
             self.start_crawler()
 
         if chapter_number < 0:
-            chapter_number = self.last_chapter_number + chapter_number + 1
+            chapter_number = self.get_last_chapter_number(ext_name) + chapter_number + 1
 
         citems = self.comicbook_item.citems.get(ext_name, {})
         if chapter_number not in citems:
@@ -1,22 +1,81 @@
-import datetime
+import os
+import json
 import time
 import logging
 import re
+import threading
 from collections import defaultdict
-
-import execjs
-from bs4 import BeautifulSoup
+from operator import attrgetter
 
 from .exceptions import URLException
-from .session import SessionMgr
+from .utils import ensure_file_dir_exists
 
 logger = logging.getLogger(__name__)
 
+_DEFAULT_HTML_PARSER = None
+
+
+def get_default_html_parser():
+    """安装了 lxml 就用 lxml，否则用内置的 html.parser
+    """
+    global _DEFAULT_HTML_PARSER
+    if _DEFAULT_HTML_PARSER is None:
+        try:
+            import lxml  # noqa
+            _DEFAULT_HTML_PARSER = 'lxml'
+        except ImportError:
+            _DEFAULT_HTML_PARSER = 'html.parser'
+    return _DEFAULT_HTML_PARSER
+
+
+# TreeBuilder 解析时会保存状态，不能跨线程共用，每个线程各建一份
+_soup_builders = threading.local()
+
+
+def new_soup(html, parser):
+    """复用当前线程里同一解析器的 TreeBuilder 创建 BeautifulSoup
+    """
+    from bs4 import BeautifulSoup
+    from bs4.builder import builder_registry
+    builders = getattr(_soup_builders, 'builders', None)
+    if builders is None:
+        builders = _soup_builders.builders = {}
+    if parser not in builders:
+        builders[parser] = builder_registry.lookup(parser)()
+    return BeautifulSoup(html, builder=builders[parser])
+
+
+def _make_to_dict(fields):
+    """根据 FIELDS 生成 to_dict，逐个读取属性，省掉 getattr 的调用开销
+    """
+    items = ", ".join("{0!r}: self.{0}".format(field) for field in fields)
+    namespace = {}
+    exec("def to_dict(self):\n    return {%s}\n" % items, namespace)
+    return namespace['to_dict']
+
+
+# (秒级时间戳, 格式化后的时间)
+_crawl_time_cache = (0, "")
+
+
+def get_crawl_time():
+    """当前时间字符串，同一秒内复用上次的格式化结果
+    """
+    global _crawl_time_cache
+    now = int(time.time())
+    if now != _crawl_time_cache[0]:
+        _crawl_time_cache = (now, time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now)))
+    return _crawl_time_cache[1]
+
 
 class ComicBookItem():
     FIELDS = ["comicid", "name", "desc", "tag", "cover_image_url", "author",
               "source_url", "source_name", "crawl_time", "chapters", "ext_chapters",
               "status", 'tags', "site", "last_update_time"]
+    __slots__ = ("comicid", "name", "desc", "cover_image_url", "author",
+                 "source_url", "source_name", "crawl_time", "status", "site",
+                 "last_update_time", "default_ext_name", "citems", "_chapters_cache", "tags", "_tag_str")
+    to_dict = _make_to_dict(FIELDS)
 
     def __init__(self, comicid=None, name=None, desc=None, cover_image_url=None,
                  author=None, source_url=None, source_name=None,
@@ -29,7 +88,7 @@ class ComicBookItem():
         self.author = author or ""
         self.source_url = source_url or ""
         self.source_name = source_name or ""
-        self.crawl_time = crawl_time or datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.crawl_time = crawl_time or get_crawl_time()
         self.status = status or ""
         self.site = site or ""
         self.last_update_time = last_update_time or ""
@@ -37,28 +96,31 @@ class ComicBookItem():
 
         # {'番外篇': {1: Citem(chapter_number=1, title="xx", cid="xxx"}}
         self.citems = defaultdict(dict)
+        # {ext_name: citems_to_list 的结果}，add_chapter 时失效
+        self._chapters_cache = {}
         self.tags = []
+        # tags 里所有 name 用逗号拼接，add_tag 时更新
+        self._tag_str = ""
 
     @property
     def tag(self):
-        return ",".join([tag['name'] for tag in self.tags])
-
-    def to_dict(self):
-        return {field: getattr(self, field) for field in self.FIELDS}
+        return self._tag_str
 
     def add_tag(self, name, tag=None):
         tag = tag or ''
         if name:
             self.tags.append(dict(name=name, tag=tag))
+            self._tag_str = self._tag_str + "," + name if self._tag_str else name
 
     def add_chapter(self, chapter_number, title, source_url, ext_name=None, **kwargs):
         ext_name = ext_name or ''
         self.citems[ext_name][chapter_number] = Citem(
             chapter_number=chapter_number, title=title, source_url=source_url, **kwargs)
+        self._chapters_cache.pop(ext_name, None)
 
     def citems_to_list(self, citems):
         rv = []
-        for citem in sorted(citems.values(), key=lambda x: x.chapter_number):
+        for citem in sorted(citems.values(), key=attrgetter('chapter_number')):
             rv.append(
                 {
                     "title": citem.title,
@@ -68,17 +130,21 @@ class ComicBookItem():
             )
         return rv
 
+    def get_chapter_list(self, ext_name):
+        if ext_name not in self._chapters_cache:
+            self._chapters_cache[ext_name] = self.citems_to_list(self.citems[ext_name])
+        return self._chapters_cache[ext_name]
+
     @property
     def chapters(self):
-        ext_name = self.default_ext_name
-        return self.citems_to_list(self.citems[ext_name])
+        return self.get_chapter_list(self.default_ext_name)
 
     @property
     def ext_chapters(self):
         ret = []
         for ext_name in self.citems:
             if ext_name != self.default_ext_name:
-                ext_info = dict(ext_name=ext_name, chapters=self.citems_to_list(self.citems[ext_name]))
+                ext_info = dict(ext_name=ext_name, chapters=self.get_chapter_list(ext_name))
                 ret.append(ext_info)
         return ret
 
@@ -86,16 +152,18 @@ class ComicBookItem():
 class Citem():
 
     def __init__(self, **kwargs):
-        self._kwargs = kwargs
-        for k, v in kwargs.items():
-            setattr(self, k, v)
+        # 字段不固定，直接用实例的 __dict__ 保存，不再额外保留一份 kwargs
+        self.__dict__.update(kwargs)
 
     def to_dict(self):
-        return self._kwargs
+        return self.__dict__
 
 
 class ChapterItem():
     FIELDS = ["comicid", "chapter_number", "title", "image_urls", "source_url", "site", "source_name"]
+    __slots__ = ("comicid", "chapter_number", "title", "image_urls", "source_url", "site",
+                 "source_name", "image_pipelines")
+    to_dict = _make_to_dict(FIELDS)
 
     def __init__(self, comicid, chapter_number, title, image_urls,
                  source_url=None, site=None, source_name=None,
@@ -109,12 +177,10 @@ class ChapterItem():
         self.image_pipelines = image_pipelines
         self.comicid = comicid or ""
 
-    def to_dict(self):
-        return {field: getattr(self, field) for field in self.FIELDS}
-
 
 class SearchResultItem():
     FIELDS = ["comicid", "name", "cover_image_url", "source_url", "status", "site", "source_name"]
+    __slots__ = ("_result", "site", "source_name")
 
     def __init__(self, site=None, source_name=None):
         self._result = []
@@ -136,24 +202,35 @@ class SearchResultItem():
 
 
 class TagsItem():
+    __slots__ = ("tags", "_category_index")
 
     def __init__(self):
         self.tags = []
+        # {category: (tags 列表, 已添加的 tag 集合)}
+        self._category_index = {}
 
     def add_tag(self, category, name, tag):
-        for t1 in self.tags:
-            if t1['category'] == category:
-                for t2 in t1['tags']:
-                    if tag == t2['tag']:
-                        return
-                t1['tags'].append(dict(name=name, tag=tag))
-                return
-        self.tags.append(dict(category=category, tags=[]))
-        self.tags[-1]['tags'].append(dict(name=name, tag=tag))
+        if category not in self._category_index:
+            group = dict(category=category, tags=[])
+            self.tags.append(group)
+            self._category_index[category] = (group['tags'], set())
+        tags, seen = self._category_index[category]
+        if tag in seen:
+            return
+        seen.add(tag)
+        tags.append(dict(name=name, tag=tag))
 
     def to_dict(self):
         return self.tags
 
+    @classmethod
+    def from_dict(cls, data):
+        tags_item = cls()
+        for t1 in data:
+            for t2 in t1['tags']:
+                tags_item.add_tag(category=t1['category'], name=t2['name'], tag=t2['tag'])
+        return tags_item
+
     def __iter__(self):
         return iter(self.tags)
 
@@ -165,7 +242,8 @@ class CrawlerBase():
     SITE_INDEX = ""
     LOGIN_URL = ""
 
-    COMICID_PATTERN = re.compile(r'(.*)')
+    _TRIVIAL_COMICID_PATTERN = re.compile(r'(.*)')
+    COMICID_PATTERN = _TRIVIAL_COMICID_PATTERN
     DEFAULT_COMICID = None
     DEFAULT_SEARCH_NAME = ''
     DEFAULT_TAG = ''
@@ -185,16 +263,24 @@ class CrawlerBase():
 
     # 站点编码
     SITE_ENCODEING = None
+    # BeautifulSoup 解析器，默认优先使用 lxml
+    HTML_PARSER = None
     # 是否只有单话
     SINGLE_CHAPTER = None
 
-    _TAGS_INFO = None
+    # {site: (加载时间, TagsItem)}
+    _TAGS_CACHE = {}
+    TAGS_CACHE_DIR = os.path.join(
+        os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'onepiece')
+    # 标签缓存有效期(秒)，内存和文件缓存都适用
+    TAGS_CACHE_TTL = 24 * 3600
     NODE_MODULES = ''
 
     def __init__(self):
         self.timeout = 30
         self._tag_info = None
         if self.REQUIRE_JAVASCRIPT:
+            import execjs
             try:
                 execjs.get()
             except Exception:
@@ -204,23 +290,27 @@ class CrawlerBase():
         self.timeout = timeout
 
     def get_session(self):
-        return SessionMgr.get_session(site=self.SITE)
+        from .session import SessionMgr
+        return SessionMgr.get_session(site=self.SITE, referer=self.SITE_INDEX)
 
     def export_session(self, path):
+        from .session import SessionMgr
         SessionMgr.export_session(site=self.SITE, path=path)
 
     def load_session(self, path):
+        from .session import SessionMgr
         SessionMgr.load_session(site=self.SITE, path=path)
 
     def load_cookies(self, path):
+        from .session import SessionMgr
         SessionMgr.load_cookies(site=self.SITE, path=path)
 
     def export_cookies(self, path):
+        from .session import SessionMgr
         SessionMgr.export_cookies(site=self.SITE, path=path)
 
     def send_request(self, method, url, **kwargs):
         session = self.get_session()
-        kwargs.setdefault('headers', {'Referer': self.SITE_INDEX})
         kwargs.setdefault('timeout', self.timeout)
         try:
             logger.debug('send_request. url=%s kwargs=%s', url, kwargs)
@@ -234,16 +324,46 @@ class CrawlerBase():
         site_encoding = encoding or self.SITE_ENCODEING
         if site_encoding:
             return response.content.decode(site_encoding)
-        return response.text
+        # 响应头里有 charset 时直接用，没有时(requests 默认 ISO-8859-1)才检测编码
+        encoding = response.encoding
+        if not encoding or encoding.lower() == 'iso-8859-1':
+            encoding = self.detect_encoding(response.content)
+        try:
+            return response.content.decode(encoding, errors='replace')
+        except (LookupError, TypeError):
+            # 响应头里的 charset 无效，如 charset=utf8mb4
+            return response.content.decode(self.detect_encoding(response.content), errors='replace')
+
+    @staticmethod
+    def detect_encoding(content, default='utf-8'):
+        try:
+            from charset_normalizer import from_bytes
+        except ImportError:
+            return default
+        best = from_bytes(content).best()
+        return best.encoding if best else default
 
     def get_html_and_soup(self, url, encoding=None, **kwargs):
         html = self.get_html(url, encoding=encoding, **kwargs)
-        soup = BeautifulSoup(html, 'html.parser')
+        soup = new_soup(html, self.HTML_PARSER or get_default_html_parser())
         return html, soup
 
     def get_soup(self, url, encoding=None, **kwargs):
         html = self.get_html(url, encoding=encoding, **kwargs)
-        return BeautifulSoup(html, 'html.parser')
+        return new_soup(html, self.HTML_PARSER or get_default_html_parser())
+
+    def get_lxml_tree(self, url, encoding=None, **kwargs):
+        """只用到 xpath/cssselect 时，直接用 lxml 解析，比 BeautifulSoup 快
+        """
+        try:
+            import lxml.html
+        except ImportError:
+            raise RuntimeError('pleaese install lxml first. python3 -m pip install lxml')
+        # 带 <?xml encoding="..."?> 声明的页面 lxml 不接受 str，
+        # 所以沿用 get_html 的解码结果，统一转成 utf-8 的 bytes 再解析
+        html = self.get_html(url, encoding=encoding, **kwargs)
+        parser = lxml.html.HTMLParser(encoding='utf-8')
+        return lxml.html.fromstring(html.encode('utf-8'), parser=parser)
 
     def get_json(self, url, **kwargs):
         response = self.send_request("GET", url, **kwargs)
@@ -251,7 +371,10 @@ class CrawlerBase():
 
     @classmethod
     def get_comicid_by_url(cls, comicid_or_url):
-        if comicid_or_url and isinstance(comicid_or_url, str):
+        # 未覆盖 COMICID_PATTERN 时，匹配结果就是原字符串
+        if cls.COMICID_PATTERN is CrawlerBase._TRIVIAL_COMICID_PATTERN:
+            return comicid_or_url
+        if comicid_or_url and type(comicid_or_url) is str:
             r = cls.COMICID_PATTERN.search(comicid_or_url)
             if r:
                 return r.group(1)
@@ -337,6 +460,7 @@ class CrawlerBase():
                 logger.exception('unknow error. driver quit.')
                 self.close_driver()
                 return
+            from .session import SessionMgr
             SessionMgr.update_cookies(site=self.SITE, cookies=cookies)
             if callable(check_login_status_func):
                 if check_login_status_func():
@@ -383,9 +507,50 @@ class CrawlerBase():
         self.close_driver()
 
     def get_tags_from_cache(self):
-        if self._TAGS_INFO is None:
-            self._TAGS_INFO = self.get_tags()
-        return self._TAGS_INFO
+        cache = CrawlerBase._TAGS_CACHE
+        entry = cache.get(self.SITE)
+        if entry is None or time.time() - entry[0] > self.TAGS_CACHE_TTL:
+            entry = self.load_tags_cache_file()
+            if entry is None:
+                tags_item = self.get_tags()
+                self.save_tags_cache_file(tags_item)
+                entry = (time.time(), tags_item)
+            cache[self.SITE] = entry
+        return entry[1]
+
+    def get_tags_cache_path(self):
+        return os.path.join(self.TAGS_CACHE_DIR, 'tags_{}.json'.format(self.SITE))
+
+    def load_tags_cache_file(self):
+        """
+        :return (文件修改时间, TagsItem): 文件不存在或已过期返回 None
+        """
+        path = self.get_tags_cache_path()
+        try:
+            mtime = os.path.getmtime(path)
+            if time.time() - mtime > self.TAGS_CACHE_TTL:
+                return None
+            with open(path, encoding='utf-8') as f:
+                return mtime, TagsItem.from_dict(json.load(f))
+        except FileNotFoundError:
+            return None
+        except Exception:
+            logger.warning('load tags cache error. path=%s', path, exc_info=True)
+            return None
+
+    def save_tags_cache_file(self, tags_item):
+        data = tags_item.to_dict()
+        if not data:
+            return
+        path = self.get_tags_cache_path()
+        try:
+            ensure_file_dir_exists(filepath=path)
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except Exception:
+            logger.warning('save tags cache error. path=%s', path, exc_info=True)
 
     def get_tag_id_by_name(self, name):
         for group in self.get_tags_from_cache():
@@ -51,6 +51,7 @@ class ImageDownloader(object):
     def get_session(self):
         return SessionMgr.get_session(site=self.site)
 
+    # 图片下载的重试在这一层，session 只重试建立连接失败，见 SessionMgr.new_adapter
     @retry(times=3, delay=1)
     def download_image(self, image_url, target_path, image_pipeline=None, **kwargs):
         if os.path.exists(target_path):
@@ -2,6 +2,8 @@ import json
 import pickle
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from .utils import ensure_file_dir_exists
 
@@ -15,15 +17,40 @@ class SessionMgr(object):
     }
     COOKIES_KEYS = ['name', 'value', 'path', 'domain', 'secure']
     DEFAULT_VERIFY = False
+    # 连接池大小，同一站点的图片下载可以复用连接
+    POOL_CONNECTIONS = 32
+    POOL_MAXSIZE = 64
+    # 重试分工：这里只重试建立连接失败(请求还没发出去)；
+    # 读超时、错误状态码、图片损坏由 ImageDownloader.download_image 的 @retry 负责，
+    # 站点页面请求不重试
+    CONNECT_RETRIES = 2
 
     @classmethod
-    def get_session(cls, site):
+    def new_adapter(cls):
+        retry = Retry(total=cls.CONNECT_RETRIES,
+                      connect=cls.CONNECT_RETRIES,
+                      read=False,
+                      status=0,
+                      backoff_factor=0.3)
+        return HTTPAdapter(pool_connections=cls.POOL_CONNECTIONS,
+                           pool_maxsize=cls.POOL_MAXSIZE,
+                           max_retries=retry)
+
+    @classmethod
+    def get_session(cls, site, referer=None):
         if site not in cls.SESSION_INSTANCE:
             session = requests.Session()
             session.headers.update(cls.DEFAULT_HEADERS)
             session.verify = cls.DEFAULT_VERIFY
+            adapter = cls.new_adapter()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
             cls.SESSION_INSTANCE[site] = session
-        return cls.SESSION_INSTANCE[site]
+        session = cls.SESSION_INSTANCE[site]
+        # session 可能先于 crawler 创建或者是 load_session 加载的，所以每次检查
+        if referer and 'Referer' not in session.headers:
+            session.headers['Referer'] = referer
+        return session
 
     @classmethod
     def set_session(cls, site, session):
@@ -4,8 +4,6 @@ import logging
 import zipfile
 import shutil
 
-from PIL import Image
-
 logger = logging.getLogger(__name__)
 
 
@@ -81,6 +79,7 @@ def ensure_file_dir_exists(filepath=None, dirpath=None):
 
 
 def image_dir_to_single_image(img_dir, output_dir, sort_by=None, quality=None, max_height=None):
+    from PIL import Image
     quality = quality or 95
     max_height = max_height or 65500
     assert max_height <= 65500, '图片最大高度不能超过65500'
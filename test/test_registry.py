@@ -0,0 +1,28 @@
+import os
+import re
+import importlib
+
+from onepiece.comicbook import ComicBook
+from onepiece.crawlerbase import CrawlerBase
+
+SITE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.pardir, 'onepiece', 'site')
+
+
+def test_registry_matches_crawler_cls():
+    assert set(ComicBook.CRAWLER_REGISTRY) == set(ComicBook.CRAWLER_SITE_INFO)
+    for site, (module_name, cls_name) in ComicBook.CRAWLER_REGISTRY.items():
+        crawler_cls = ComicBook.get_crawler_cls(site)
+        assert crawler_cls.__name__ == cls_name
+        assert crawler_cls.__module__ == 'onepiece' + module_name
+        assert crawler_cls.SITE == site
+        assert ComicBook.CRAWLER_SITE_INFO[site] == (crawler_cls.SOURCE_NAME, crawler_cls.SITE_INDEX)
+
+
+def test_all_crawler_registered():
+    for file in os.listdir(SITE_DIR):
+        if re.match(r"^[a-zA-Z].*?\.py$", file):
+            importlib.import_module("onepiece.site.{}".format(file.split(".")[0]))
+    registered = {(module_name, cls_name) for module_name, cls_name in ComicBook.CRAWLER_REGISTRY.values()}
+    for crawler_cls in CrawlerBase.__subclasses__():
+        key = (crawler_cls.__module__[len('onepiece'):], crawler_cls.__name__)
+        assert key in registered, 'crawler not registered. {}.{}'.format(*key)